@@ -2,13 +2,93 @@
 """
 Whisper GPU Transcription Script for Pensieve
 Uses PyTorch + ROCm for AMD GPU acceleration
+
+Usage:
+    whisper_transcribe.py <audio_file> [model] [language] [options]
+    whisper_transcribe.py <audio_file> [model] [language] --batch <audio_file> ...
+    whisper_transcribe.py --worker [--device DEVICE]
+
+In worker mode requests are read from stdin as one JSON object per line
+({"audio_path": ..., "model": ..., ...}) and each one is answered with one
+JSON line on stdout. Models are loaded by the first request that needs them
+and the two most recently used ones stay resident until {"unload": true}.
 """
 import sys
 import json
 import os
-import whisper
-import torch
+import gc
+import platform
+import hashlib
+import subprocess
+import types
+import numpy as np
 from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager, redirect_stdout
+
+# orjson is optional and speeds up writing large transcripts
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Run CPU inference with one thread per physical core, hyperthreads share
+# L1/L2 and oversubscribing them thrashes the caches. OpenMP and MKL read
+# these when torch is imported, explicit settings from the caller win.
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 2) // 2)))
+os.environ.setdefault("MKL_NUM_THREADS", os.environ["OMP_NUM_THREADS"])
+
+# PyTorch, Whisper and faster-whisper take seconds to import (CUDA/ROCm
+# init), so they're only imported once the arguments have been validated,
+# see import_backends()
+torch = None
+whisper = None
+ctranslate2 = None
+WhisperModel = None
+
+def import_backends():
+    """
+    Import PyTorch, Whisper and the optional faster-whisper backend, and
+    configure PyTorch for inference
+    """
+    global torch, whisper, ctranslate2, WhisperModel
+
+    if torch is not None:
+        return
+
+    import torch
+    import whisper
+
+    # faster-whisper (CTranslate2) is optional; when installed it replaces the
+    # PyTorch reference implementation on CPU and NVIDIA GPUs
+    try:
+        import ctranslate2
+        from faster_whisper import WhisperModel
+    except ImportError:
+        ctranslate2 = None
+        WhisperModel = None
+
+    # Nothing in here is trained, don't record autograd metadata for any op
+    torch.set_grad_enabled(False)
+
+    torch.set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+    torch.set_num_interop_threads(2)
+
+    # Dynamic int8 quantization kernels: qnnpack on ARM, fbgemm on x86
+    engine = "qnnpack" if platform.machine().lower() in ("arm64", "aarch64") else "fbgemm"
+    if engine in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = engine
+
+    # Let the remaining FP32 ops use TF32 tensor cores on Ampere and newer GPUs.
+    # cuDNN autotuning pays off since Whisper always sees 30 second windows of
+    # the same shape. Set before any model is loaded so layer dispatch sees it.
+    torch.set_float32_matmul_precision("high")
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.backends.cudnn.benchmark = True
+
+# Persistent caches (compiled kernels, ...) shared across script launches
+cache_dir = Path.home() / ".cache" / "pensieve"
 
 # Force UTF-8 encoding for stdout to handle Unicode characters in transcriptions
 # This prevents 'charmap' codec errors on Windows
@@ -16,6 +96,9 @@ if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 if sys.stderr.encoding != 'utf-8':
     sys.stderr.reconfigure(encoding='utf-8')
+# Worker requests are UTF-8 JSON, piped stdin defaults to the ANSI code page
+if sys.stdin.encoding != 'utf-8':
+    sys.stdin.reconfigure(encoding='utf-8')
 
 # Add ffmpeg from Pensieve's extra folder to PATH
 # In packaged app, the script is in the same directory as ffmpeg (extraResources)
@@ -32,19 +115,557 @@ else:
 if extra_dir.exists():
     os.environ["PATH"] = str(extra_dir) + os.pathsep + os.environ.get("PATH", "")
 
-def transcribe_audio(audio_path, model_name="base", language=None, device="auto",
+def resolve_device(device):
+    """
+    Resolve the requested inference device
+
+    Args:
+        device: Device for inference ('auto', 'cuda', 'cpu')
+
+    Returns:
+        str: Concrete device name ('cuda' or 'cpu')
+    """
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    print(f"Using device: {device}", file=sys.stderr)
+
+    if device == "cuda" and torch.cuda.is_available():
+        gpu_name = torch.cuda.get_device_name(0)
+        print(f"GPU: {gpu_name}", file=sys.stderr)
+
+    return device
+
+def use_faster_whisper(device):
+    """
+    Whether the faster-whisper backend should be used on the given device.
+    CTranslate2 only ships CUDA kernels for NVIDIA GPUs, so ROCm builds of
+    PyTorch stay on the PyTorch path.
+    """
+    if WhisperModel is None:
+        return False
+    if device == "cpu":
+        return True
+    return (device == "cuda" and torch.version.hip is None
+            and ctranslate2.get_cuda_device_count() > 0)
+
+def is_faster_whisper(model):
+    return WhisperModel is not None and isinstance(model, WhisperModel)
+
+def compile_model(model, device, fp16=True):
+    """
+    Compile the encoder and decoder of a PyTorch Whisper model with
+    torch.compile and warm them up, so the first transcription doesn't pay
+    for compilation. Compiled graphs are cached on disk across launches.
+    """
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir / "inductor"))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+
+    print("Compiling Whisper model...", file=sys.stderr)
+    model.encoder = torch.compile(model.encoder, mode="reduce-overhead", fullgraph=False)
+    model.decoder = torch.compile(model.decoder, mode="reduce-overhead", fullgraph=False)
+
+    # One second of silence runs both the encoder and the decoder loop. Warm
+    # up under the same inference mode, autocast and precision as
+    # transcribe_audio, anything else makes Dynamo recompile on first use.
+    half = fp16 and device == "cuda"
+    half_dtype = half_precision_dtype() if half else torch.float16
+    bf16 = half_dtype == torch.bfloat16
+    with (
+        torch.inference_mode(),
+        torch.autocast("cuda", dtype=half_dtype, enabled=half),
+        float_encoder_output(model, bf16),
+    ):
+        model.transcribe(torch.zeros(whisper.audio.SAMPLE_RATE), fp16=half and not bf16,
+                         verbose=None)
+    return model
+
+# Set once Whisper's attention was patched to use SDPA (older releases only)
+sdpa_patched = False
+original_qkv_attention = None
+
+def sdpa_qkv_attention(self, q, k, v, mask=None):
+    """
+    Whisper's qkv_attention on top of scaled_dot_product_attention, which
+    dispatches to fused flash / memory-efficient attention kernels instead
+    of materializing the full QK^T matrix
+    """
+    if not whisper.model.MultiHeadAttention.use_sdpa:
+        return original_qkv_attention(self, q, k, v, mask)
+
+    n_ctx = q.shape[1]
+    # [B, T, H * D] -> [B, H, T, D]
+    q = q.view(*q.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
+    k = k.view(*k.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
+    v = v.view(*v.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
+
+    # Whisper scales q and k by d^-0.25 each, which is SDPA's default d^-0.5.
+    # With a kv-cache, single token steps attend to everything and need no mask.
+    a = torch.nn.functional.scaled_dot_product_attention(
+        q, k, v, is_causal=mask is not None and n_ctx > 1
+    )
+    return a.permute(0, 2, 1, 3).flatten(start_dim=2), None
+
+def sdpa_matches_original(attention):
+    """
+    Check sdpa_qkv_attention against Whisper's own qkv_attention on random
+    inputs: full attention, causal attention, and a single token step with a
+    kv-cache, which is how the decoder calls it
+    """
+    n_state, n_head, n_ctx = 64, 4, 8
+    layer = attention(n_state, n_head)
+    mask = torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1)
+    generator = torch.Generator().manual_seed(0)
+
+    for n_q, case_mask in ((n_ctx, None), (n_ctx, mask), (1, mask)):
+        q = torch.randn(2, n_q, n_state, generator=generator)
+        k = torch.randn(2, n_ctx, n_state, generator=generator)
+        v = torch.randn(2, n_ctx, n_state, generator=generator)
+        expected, _ = original_qkv_attention(layer, q, k, v, case_mask)
+        actual, _ = sdpa_qkv_attention(layer, q, k, v, case_mask)
+        if not torch.allclose(actual, expected, atol=1e-5):
+            return False
+
+    return True
+
+def enable_sdpa():
+    """
+    Make Whisper's attention layers use scaled_dot_product_attention
+    """
+    global sdpa_patched, original_qkv_attention
+
+    attention = whisper.model.MultiHeadAttention
+    if hasattr(attention, "use_sdpa"):
+        # Built in since openai-whisper 20240927, or already patched
+        attention.use_sdpa = True
+        return
+
+    original_qkv_attention = attention.qkv_attention
+    attention.use_sdpa = True
+    if not sdpa_matches_original(attention):
+        # Keep Whisper's attention if this release computes it differently
+        print("SDPA attention doesn't match Whisper's, not using it", file=sys.stderr)
+        del attention.use_sdpa
+        return
+
+    attention.qkv_attention = sdpa_qkv_attention
+    sdpa_patched = True
+
+@contextmanager
+def sdpa_disabled(disabled=True):
+    """
+    Temporarily fall back to Whisper's own attention, which also returns the
+    attention weights needed for word timestamp alignment
+    """
+    attention = whisper.model.MultiHeadAttention
+    previous = attention.use_sdpa
+    attention.use_sdpa = previous and not disabled
+    try:
+        yield
+    finally:
+        attention.use_sdpa = previous
+
+def quantize_model(model):
+    """
+    Quantize the linear layers of a PyTorch Whisper model on the CPU to
+    dynamic int8
+    """
+    # Whisper's Linear subclass only casts weights to the input dtype, which
+    # is a no-op in FP32. quantize_dynamic only swaps exact nn.Linear modules.
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+
+    print("Quantizing Whisper model to int8...", file=sys.stderr)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8,
+                                                 inplace=True)
+
+def use_onnx_encoder(model, model_name):
+    """
+    Replace the encoder of a PyTorch Whisper model with an ONNX Runtime
+    session. The encoder is exported once to ~/.cache/pensieve/onnx and run
+    on the best available execution provider (CUDA, DirectML, CPU). The
+    decoder stays in PyTorch, its kv-cache hooks don't survive an export.
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("The onnx backend requires the onnxruntime package")
+
+    path = cache_dir / "onnx" / model_name / "encoder.onnx"
+    if not path.exists():
+        print(f"Exporting Whisper {model_name} encoder to ONNX...", file=sys.stderr)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        mel = torch.zeros(1, model.dims.n_mels, whisper.audio.N_FRAMES, device=model.device)
+        tmp_path = path.with_suffix(".tmp")
+        torch.onnx.export(
+            model.encoder, mel, str(tmp_path),
+            input_names=["mel"],
+            output_names=["audio_features"],
+            # The encoder only accepts full 30 second windows, only the
+            # batch size varies
+            dynamic_axes={"mel": {0: "batch"}, "audio_features": {0: "batch"}},
+            opset_version=17,
+        )
+        os.replace(tmp_path, path)
+
+    available = ort.get_available_providers()
+    providers = [
+        provider
+        for provider in ("CUDAExecutionProvider", "DmlExecutionProvider", "CPUExecutionProvider")
+        if provider in available
+    ]
+
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # DirectML doesn't support memory patterns
+    sess_options.enable_mem_pattern = providers[0] != "DmlExecutionProvider"
+    session = ort.InferenceSession(str(path), sess_options, providers=providers)
+    print(f"ONNX Runtime provider: {session.get_providers()[0]}", file=sys.stderr)
+
+    class OnnxEncoder(torch.nn.Module):
+        def forward(self, mel):
+            (features,) = session.run(None, {"mel": mel.float().cpu().numpy()})
+            return torch.from_numpy(features).to(device=mel.device, dtype=mel.dtype)
+
+    model.encoder = OnnxEncoder()
+    return model
+
+def load_model(model_name, device, compile=False, int8=True, backend="torch", fp16=True):
+    """
+    Load a Whisper model onto the given device
+
+    Args:
+        model_name: Whisper model size (tiny, base, small, medium, large, turbo)
+        device: Resolved device ('cuda' or 'cpu')
+        compile: Compile the PyTorch model with torch.compile (CUDA only)
+        int8: Use int8 weights on the CPU
+        backend: 'torch', or 'onnx' to run the encoder on ONNX Runtime
+        fp16: Use FP16 precision on GPU (faster-whisper picks it at load time)
+
+    Returns:
+        Loaded Whisper model, either a faster-whisper WhisperModel or a
+        PyTorch Whisper model
+    """
+    if backend == "torch" and use_faster_whisper(device):
+        # int8 weights halve memory traffic on CPU with minimal accuracy loss
+        if device == "cpu":
+            compute_type = "int8" if int8 else "float32"
+        else:
+            # Some GPUs (e.g. GTX 16xx) produce garbage in FP16
+            compute_type = "float16" if fp16 else "float32"
+        print(f"Loading faster-whisper {model_name} model ({compute_type})...", file=sys.stderr)
+        try:
+            model = WhisperModel(model_name, device=device, compute_type=compute_type,
+                                 cpu_threads=int(os.environ["OMP_NUM_THREADS"]))
+            # CTranslate2 loads cuBLAS/cuDNN lazily, decode one second of
+            # silence so missing libraries fail here and not on the first request
+            segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), language="en",
+                                           beam_size=1)
+            list(segments)
+            return model
+        except Exception as e:
+            # Missing CUDA libraries (cuBLAS/cuDNN), no CTranslate2 download
+            # while offline, or a model this faster-whisper release doesn't know
+            print(f"faster-whisper unavailable on {device}, falling back to PyTorch: {e}",
+                  file=sys.stderr)
+
+    print(f"Loading Whisper {model_name} model...", file=sys.stderr)
+    model = whisper.load_model(model_name, device=device)
+    enable_sdpa()
+
+    if backend == "onnx":
+        model = use_onnx_encoder(model, model_name)
+    elif compile and device == "cuda":
+        model = compile_model(model, device, fp16)
+    if int8 and device == "cpu":
+        model = quantize_model(model)
+
+    return model
+
+def load_audio(audio_path, sample_rate=16000):
+    """
+    Decode an audio file to mono float32 PCM, as expected by Whisper
+
+    Same ffmpeg invocation as whisper.load_audio, but without ffmpeg's banner
+    and log output, and scaled with an in-place float32 multiply instead of
+    a divide.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-threads", "0", "-i", str(audio_path),
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"Failed to load audio: {err.decode(errors='replace').strip()}")
+
+    audio = np.frombuffer(out, np.int16).astype(np.float32)
+    audio *= np.float32(1.0 / 32768.0)
+    return audio
+
+def compute_mel(audio_path, n_mels, audio=None, cache=False):
+    """
+    Compute the padded log-mel spectrogram Whisper's transcribe() works on
+
+    Args:
+        audio_path: Path to audio file
+        n_mels: Number of mel bins of the model
+        audio: Already decoded audio of audio_path, or None to decode the file
+        cache: Keep the spectrogram on disk, keyed by the file's content, so
+            transcribing the same file again skips decoding and mel extraction
+
+    Returns:
+        torch.Tensor: Log-mel spectrogram on the CPU
+    """
+    cache_path = None
+    if cache:
+        with open(audio_path, "rb") as f:
+            digest = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+        cache_path = cache_dir / "mel" / f"{digest}-{n_mels}.pt"
+        if cache_path.exists():
+            print("Using cached mel spectrogram", file=sys.stderr)
+            return torch.load(cache_path)
+
+    if audio is None:
+        audio = load_audio(audio_path)
+    mel = whisper.log_mel_spectrogram(audio, n_mels, padding=whisper.audio.N_SAMPLES)
+
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so an interrupted run can't leave a
+        # truncated cache entry behind
+        tmp_path = cache_path.with_suffix(".tmp")
+        torch.save(mel, tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    return mel
+
+@contextmanager
+def use_mel(mel):
+    """
+    Make Whisper's transcribe() use a precomputed log-mel spectrogram instead
+    of computing its own from the audio
+    """
+    transcribe_module = sys.modules["whisper.transcribe"]
+    original = transcribe_module.log_mel_spectrogram
+    transcribe_module.log_mel_spectrogram = lambda *args, **kwargs: mel
+    try:
+        yield
+    finally:
+        transcribe_module.log_mel_spectrogram = original
+
+class ProgressReporter:
+    """
+    Progress bar reporting 'Progress: N%' lines on stderr, which Pensieve
+    parses. Stands in for the tqdm bar of Whisper's transcribe(), which is
+    advanced after every decoded 30 second window.
+    """
+
+    def __init__(self, total=None, **kwargs):
+        self.total = total
+        self.n = 0
+        self.percent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def update(self, n=1):
+        self.n += n
+        if self.total:
+            self.report(self.n / self.total)
+
+    def report(self, fraction):
+        percent = min(100, int(100 * fraction))
+        if percent > self.percent:
+            self.percent = percent
+            print(f"Progress: {percent}%", file=sys.stderr, flush=True)
+
+@contextmanager
+def report_progress():
+    """
+    Make Whisper's transcribe() report progress through ProgressReporter
+    """
+    transcribe_module = sys.modules["whisper.transcribe"]
+    original = transcribe_module.tqdm
+    transcribe_module.tqdm = types.SimpleNamespace(tqdm=ProgressReporter)
+    try:
+        yield
+    finally:
+        transcribe_module.tqdm = original
+
+@contextmanager
+def reuse_encoder_output(model, mel, features):
+    """
+    Let the model reuse encoder features for the given mel window
+    """
+
+    class EncoderCache(torch.nn.Module):
+        """
+        Encoder wrapper that returns the already computed features when
+        called with the mel window they were computed from
+        """
+
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, x):
+            if x.shape == mel.shape and torch.equal(x, mel):
+                return features
+            return self.encoder(x)
+
+    encoder = model.encoder
+    model.encoder = EncoderCache(encoder)
+    try:
+        yield
+    finally:
+        model.encoder = encoder
+
+def half_precision_dtype():
+    """
+    Half precision type for CUDA autocast. BF16 keeps FP32's exponent range,
+    so Whisper's softmax can't overflow, and runs on tensor cores from
+    Ampere (compute capability 8) on. ROCm and older NVIDIA GPUs use FP16.
+    """
+    if torch.version.hip is None and torch.cuda.get_device_capability(0)[0] >= 8:
+        return torch.bfloat16
+    return torch.float16
+
+@contextmanager
+def float_encoder_output(model, enabled=True):
+    """
+    Cast the encoder output to FP32. Whisper only accepts FP16 or FP32 audio
+    features, but the encoder returns BF16 ones under BF16 autocast.
+    """
+    if not enabled:
+        yield
+        return
+
+    handle = model.encoder.register_forward_hook(lambda module, args, output: output.float())
+    try:
+        yield
+    finally:
+        handle.remove()
+
+def first_window(mel, dtype):
+    """
+    The first 30 second window of a padded log-mel spectrogram, prepared
+    exactly like transcribe() prepares it for the encoder
+    """
+    content_frames = mel.shape[-1] - whisper.audio.N_FRAMES
+    segment = mel[:, :min(whisper.audio.N_FRAMES, content_frames)]
+    return whisper.pad_or_trim(segment, whisper.audio.N_FRAMES).to(dtype).unsqueeze(0)
+
+def transcribe_faster_whisper(model, audio, language=None, temperature=0,
+                              compression_ratio_threshold=2.4, logprob_threshold=-1.0,
+                              no_speech_threshold=0.6, translate=False,
+                              condition_on_previous_text=True, initial_prompt=None,
+                              word_timestamps=False):
+    """
+    Transcribe decoded audio using a faster-whisper model
+
+    Returns:
+        dict: Result in the same shape as Whisper's transcribe()
+    """
+    segments, info = model.transcribe(
+        audio,
+        language=language if language else None,
+        task="translate" if translate else "transcribe",
+        # Greedy decoding, same as the PyTorch path
+        beam_size=1,
+        temperature=temperature,
+        compression_ratio_threshold=compression_ratio_threshold,
+        log_prob_threshold=logprob_threshold,
+        no_speech_threshold=no_speech_threshold,
+        condition_on_previous_text=condition_on_previous_text,
+        initial_prompt=initial_prompt,
+        word_timestamps=word_timestamps,
+        vad_filter=False,
+    )
+
+    # Segments are decoded lazily while iterating
+    progress = ProgressReporter()
+    result_segments = []
+    for seg in segments:
+        result_segments.append({"start": seg.start, "end": seg.end, "text": seg.text})
+        if info.duration:
+            progress.report(seg.end / info.duration)
+
+    return {
+        "text": "".join(seg["text"] for seg in result_segments),
+        "language": info.language,
+        "segments": result_segments,
+    }
+
+class WorkerState:
+    """
+    Keeps the most recently used models resident between worker requests, so
+    switching back and forth between two models doesn't reload them
+    """
+
+    max_models = 2
+
+    def __init__(self, **load_options):
+        self.load_options = load_options
+        self.models = OrderedDict()
+
+    def get_model(self, model_name, device, fp16=True):
+        device = resolve_device(device)
+        # faster-whisper fixes its precision at load time, so FP16 and FP32
+        # GPU models are kept apart
+        fp16 = fp16 or device != "cuda"
+        key = (model_name, device, fp16)
+
+        if key in self.models:
+            self.models.move_to_end(key)
+            return self.models[key], device
+
+        # Evict before loading the next model to keep peak memory down
+        while len(self.models) >= self.max_models:
+            self.evict()
+
+        self.models[key] = load_model(model_name, device, fp16=fp16, **self.load_options)
+        return self.models[key], device
+
+    def evict(self):
+        """
+        Unload the least recently used model and release its GPU memory
+        """
+        (model_name, device, _), model = self.models.popitem(last=False)
+        print(f"Unloading Whisper {model_name} model", file=sys.stderr)
+        del model
+        gc.collect()
+        if device == "cuda" and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def unload(self):
+        """
+        Unload all models, e.g. to leave the GPU to the summary LLM
+        """
+        while self.models:
+            self.evict()
+
+def transcribe_audio(model, audio_path, device="cpu", audio=None, language=None,
                      temperature=0, compression_ratio_threshold=2.4, 
                      logprob_threshold=-1.0, no_speech_threshold=0.6,
                      fp16=True, translate=False, condition_on_previous_text=True,
-                     initial_prompt=None, word_timestamps=False):
+                     initial_prompt=None, word_timestamps=False, cache_mel=False):
     """
-    Transcribe audio file using Whisper with GPU acceleration
+    Transcribe audio file using a preloaded Whisper model
     
     Args:
+        model: Loaded Whisper or faster-whisper model (see load_model)
         audio_path: Path to audio file
-        model_name: Whisper model size (tiny, base, small, medium, large, turbo)
+        device: Device the model was loaded on ('cuda', 'cpu')
+        audio: Already decoded audio of audio_path (see load_audio), or None
+            to decode the file
         language: Language code (e.g., 'en', 'es') or None/empty for auto-detect
-        device: Device for inference ('auto', 'cuda', 'cpu')
         temperature: Sampling temperature (0 = greedy)
         compression_ratio_threshold: Gzip compression ratio threshold
         logprob_threshold: Average log probability threshold
@@ -54,35 +675,46 @@ def transcribe_audio(audio_path, model_name="base", language=None, device="auto"
         condition_on_previous_text: Condition on previous text
         initial_prompt: Optional initial prompt
         word_timestamps: Extract word-level timestamps
+        cache_mel: Cache the mel spectrogram on disk (PyTorch models only)
     
     Returns:
         dict: Transcription result with text and segments
     """
-    # Determine device
-    if device == "auto":
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-    
-    print(f"Using device: {device}", file=sys.stderr)
-    
-    if device == "cuda" and torch.cuda.is_available():
-        gpu_name = torch.cuda.get_device_name(0)
-        print(f"GPU: {gpu_name}", file=sys.stderr)
-    
-    # Load model
-    print(f"Loading Whisper {model_name} model...", file=sys.stderr)
-    model = whisper.load_model(model_name, device=device)
-    
     # Transcribe with progress callback
     print(f"Transcribing: {audio_path}", file=sys.stderr)
     
-    # Note: whisper doesn't provide built-in progress callback,
-    # but we can at least indicate start/end
+    # Progress in between is reported per decoded window / segment
     print("Progress: 0%", file=sys.stderr)
+
+    if is_faster_whisper(model):
+        if audio is None:
+            audio = load_audio(audio_path)
+        result = transcribe_faster_whisper(
+            model,
+            audio,
+            language=language,
+            temperature=temperature,
+            compression_ratio_threshold=compression_ratio_threshold,
+            logprob_threshold=logprob_threshold,
+            no_speech_threshold=no_speech_threshold,
+            translate=translate,
+            condition_on_previous_text=condition_on_previous_text,
+            initial_prompt=initial_prompt,
+            word_timestamps=word_timestamps,
+        )
+        print("Progress: 100%", file=sys.stderr)
+        return result
     
+    # Half precision runs under autocast, as BF16 where supported. Whisper's
+    # own fp16 flag is only used for FP16, with BF16 it keeps FP32 inputs.
+    half = fp16 and device == "cuda"
+    half_dtype = half_precision_dtype() if half else torch.float16
+    bf16 = half_dtype == torch.bfloat16
+
     # Build transcription parameters
     transcribe_params = {
         "language": language if language else None,
-        "fp16": fp16 and device == "cuda",
+        "fp16": half and not bf16,
         "verbose": False,
         "temperature": temperature,
         "compression_ratio_threshold": compression_ratio_threshold,
@@ -98,23 +730,320 @@ def transcribe_audio(audio_path, model_name="base", language=None, device="auto"
     if initial_prompt:
         transcribe_params["initial_prompt"] = initial_prompt
     
-    result = model.transcribe(str(audio_path), **transcribe_params)
+    mel = compute_mel(audio_path, model.dims.n_mels, audio=audio, cache=cache_mel)
+
+    # Autocast moves the ops Whisper leaves in FP32 (mel input, parts of the
+    # decoder) onto tensor cores as well. Whisper checks the dtype of the
+    # encoder output against its fp16 flag, so BF16 output is cast back.
+    with (
+        torch.inference_mode(),
+        torch.autocast("cuda", dtype=half_dtype, enabled=half),
+        float_encoder_output(model, bf16),
+        use_mel(mel),
+        report_progress(),
+        # Word timestamp alignment needs the attention weights
+        sdpa_disabled(sdpa_patched and word_timestamps),
+    ):
+        # Whisper detects the language on the padded mel, but decodes windows
+        # padded with zeros. Both only match once the first window is full.
+        content_frames = mel.shape[-1] - whisper.audio.N_FRAMES
+        if (transcribe_params["language"] or not model.is_multilingual
+                or content_frames < whisper.audio.N_FRAMES):
+            result = model.transcribe(mel, **transcribe_params)
+        else:
+            # Whisper's own language detection encodes the first window once
+            # for detection and again for decoding. Encode it once here, and
+            # hand the features to both detection and the decoder.
+            dtype = torch.float16 if transcribe_params["fp16"] else torch.float32
+            window = first_window(mel, dtype).to(model.device)
+            features = model.encoder(window)
+            _, probs = model.detect_language(features)
+            transcribe_params["language"] = max(probs[0], key=probs[0].get)
+            print(f"Detected language: {transcribe_params['language']}", file=sys.stderr)
+
+            with reuse_encoder_output(model, window, features):
+                result = model.transcribe(mel, **transcribe_params)
     
     print("Progress: 100%", file=sys.stderr)
     
     return result
 
+def segments_from_tokens(tokens, tokenizer, duration):
+    """
+    Split decoded tokens into segments at Whisper's timestamp tokens
+    """
+    segments = []
+    start = 0.0
+    text_tokens = []
+
+    for token in tokens:
+        if token < tokenizer.timestamp_begin:
+            if token < tokenizer.eot:
+                text_tokens.append(token)
+            continue
+
+        time = (token - tokenizer.timestamp_begin) / whisper.audio.TOKENS_PER_SECOND
+        if text_tokens:
+            segments.append({"start": start, "end": time, "text": tokenizer.decode(text_tokens)})
+            text_tokens = []
+        start = time
+
+    if text_tokens:
+        segments.append({"start": start, "end": duration, "text": tokenizer.decode(text_tokens)})
+
+    return segments
+
+def decode_batch(model, batch, device="cpu", **options):
+    """
+    Transcribe files that fit into a single 30 second window with one batched
+    encoder pass and a batched decode
+
+    Args:
+        model: Loaded PyTorch Whisper model
+        batch: (audio, mel) pairs of decoded audio and its padded log-mel
+            spectrogram (see compute_mel)
+        device: Device the model was loaded on ('cuda', 'cpu')
+        **options: transcribe_audio keyword arguments
+
+    Returns:
+        list: Transcription results in the order of batch, None for windows
+        that failed the thresholds and need transcribe()'s fallback
+    """
+    half = options.get("fp16", True) and device == "cuda"
+    half_dtype = half_precision_dtype() if half else torch.float16
+    bf16 = half_dtype == torch.bfloat16
+    fp16 = half and not bf16
+    task = "translate" if options.get("translate") else "transcribe"
+    # English-only models have no language tokens to detect
+    language = options.get("language") or (None if model.is_multilingual else "en")
+
+    # Windows are built from the padded mel like transcribe() builds them, so
+    # batched and single file transcription see the same input
+    dtype = torch.float16 if fp16 else torch.float32
+    mel = torch.cat([first_window(mel, dtype) for _, mel in batch]).to(model.device)
+
+    decode_options = whisper.DecodingOptions(
+        task=task,
+        language=language,
+        temperature=options.get("temperature", 0),
+        prompt=options.get("initial_prompt") or None,
+        fp16=fp16,
+    )
+
+    with (
+        torch.inference_mode(),
+        torch.autocast("cuda", dtype=half_dtype, enabled=half),
+        float_encoder_output(model, bf16),
+    ):
+        # Encoded features are passed on as-is, the decoder skips its own
+        # encoder pass for them
+        audio_features = model.encoder(mel)
+        decoded = whisper.decode(model, audio_features, decode_options)
+
+    compression_ratio_threshold = options.get("compression_ratio_threshold", 2.4)
+    logprob_threshold = options.get("logprob_threshold", -1.0)
+    no_speech_threshold = options.get("no_speech_threshold", 0.6)
+
+    # Same checks as transcribe() applies to a window. condition_on_previous_text
+    # only affects later windows, a single window file has none.
+    results = []
+    for (audio, _), result in zip(batch, decoded):
+        no_speech = (
+            no_speech_threshold is not None
+            and result.no_speech_prob > no_speech_threshold
+            and (logprob_threshold is None or result.avg_logprob < logprob_threshold)
+        )
+        if no_speech:
+            results.append({"text": "", "language": result.language, "segments": []})
+            continue
+
+        failed = (
+            (compression_ratio_threshold is not None
+             and result.compression_ratio > compression_ratio_threshold)
+            or (logprob_threshold is not None and result.avg_logprob < logprob_threshold)
+        )
+        if failed:
+            results.append(None)
+            continue
+
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages,
+            language=result.language, task=task,
+        )
+        duration = audio.shape[0] / whisper.audio.SAMPLE_RATE
+        results.append({
+            "text": result.text,
+            "language": result.language,
+            "segments": segments_from_tokens(result.tokens, tokenizer, duration),
+        })
+
+    return results
+
+def transcribe_audio_batch(model, audio_paths, device="cpu", batch_size=16, **options):
+    """
+    Transcribe several audio files, running files that fit into a single
+    30 second window through batched encoder passes and decodes
+
+    Args:
+        model: Loaded Whisper or faster-whisper model (see load_model)
+        audio_paths: Paths to audio files
+        device: Device the model was loaded on ('cuda', 'cpu')
+        batch_size: Maximum number of files per batched pass
+        **options: transcribe_audio keyword arguments
+
+    Returns:
+        list: Transcription results in the order of audio_paths
+    """
+    # Only the PyTorch model exposes the encoder/decoder split, and the
+    # single-window decode has no timestamp alignment
+    if is_faster_whisper(model) or options.get("word_timestamps"):
+        return [transcribe_audio(model, audio_path, device=device, **options)
+                for audio_path in audio_paths]
+
+    results = [None] * len(audio_paths)
+    pending = []
+
+    def flush():
+        print(f"Transcribing {len(pending)} files in one batch", file=sys.stderr)
+        batch = [(audio, mel) for _, _, audio, mel in pending]
+        decoded = decode_batch(model, batch, device=device, **options)
+        for (i, audio_path, audio, _), result in zip(pending, decoded):
+            if result is None:
+                # Failed the thresholds, the regular path handles the fallback
+                result = transcribe_audio(model, audio_path, device=device, audio=audio,
+                                          **options)
+            results[i] = result
+        pending.clear()
+
+    for i, audio_path in enumerate(audio_paths):
+        audio = load_audio(audio_path)
+        if audio.shape[0] > whisper.audio.N_SAMPLES:
+            # Longer files go through the regular path right away, so their
+            # audio isn't kept around until the end
+            results[i] = transcribe_audio(model, audio_path, device=device, audio=audio,
+                                          **options)
+            continue
+
+        mel = compute_mel(audio_path, model.dims.n_mels, audio=audio,
+                          cache=options.get("cache_mel", False))
+        pending.append((i, audio_path, audio, mel))
+        if len(pending) == batch_size:
+            flush()
+
+    if pending:
+        flush()
+
+    return results
+
+def format_result(result):
+    """
+    Reduce a Whisper result to the JSON structure Pensieve parses
+    """
+    return {
+        "text": result["text"].strip(),
+        "language": result["language"],
+        "segments": [
+            {
+                "start": seg["start"],
+                "end": seg["end"],
+                "text": seg["text"].strip()
+            }
+            for seg in result["segments"]
+        ]
+    }
+
+def write_json(output):
+    """
+    Write one JSON document as a single UTF-8 line to stdout
+    """
+    if orjson is not None:
+        data = orjson.dumps(output, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        data = json.dumps(output, ensure_ascii=False).encode("utf-8")
+
+    # Don't interleave with anything still buffered in the text layer
+    sys.stdout.flush()
+    sys.stdout.buffer.write(data + b"\n")
+    sys.stdout.buffer.flush()
+
+def handle_request(state, request, default_model, default_device):
+    """
+    Run a single worker request and build its JSON response
+
+    Args:
+        state: WorkerState holding the resident models
+        request: Decoded request with 'audio_path' and optional 'model',
+            'device' and transcribe_audio keyword arguments, or
+            {"unload": true} to unload all models
+        default_model: Model used when the request doesn't name one
+        default_device: Device used when the request doesn't name one
+
+    Returns:
+        dict: Transcription output. Errors, including ffmpeg failing on a
+        missing file, are raised and answered with {"error": message} by serve
+    """
+    if request.get("unload"):
+        state.unload()
+        return {}
+
+    request = dict(request)
+    audio_path = Path(request.pop("audio_path"))
+    model_name = request.pop("model", None) or default_model
+    device = request.pop("device", None) or default_device
+
+    # No up-front exists() check: a missing or unreadable file fails in
+    # ffmpeg, and the error is sent back like any other failure
+    model, device = state.get_model(model_name, device, fp16=request.get("fp16", True))
+    result = transcribe_audio(model, audio_path, device=device, **request)
+    return format_result(result)
+
+def serve(model_name, device, **load_options):
+    """
+    Long-lived worker mode: reads one JSON request per line from stdin and
+    writes one JSON response per line to stdout, reusing the loaded model
+    across requests
+    """
+    state = WorkerState(**load_options)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        # stdout only carries responses. Whisper and other libraries print
+        # to it (e.g. 'Detected language: ...'), send that to stderr.
+        with redirect_stdout(sys.stderr):
+            try:
+                output = handle_request(state, json.loads(line), model_name, device)
+            except Exception as e:
+                print(f"Error during transcription: {e}", file=sys.stderr)
+                import traceback
+                traceback.print_exc(file=sys.stderr)
+                output = {"error": str(e)}
+
+        write_json(output)
+
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description="Whisper GPU Transcription")
-    parser.add_argument("audio_file", help="Path to audio file")
+    parser.add_argument("audio_file", nargs="?", help="Path to audio file")
     parser.add_argument("model", nargs="?", default="base", 
                        help="Model size (tiny, base, small, medium, large, turbo)")
     parser.add_argument("language", nargs="?", default="", 
                        help="Language code (e.g., 'en', 'es') or empty for auto-detect")
+    parser.add_argument("--batch", nargs="+", default=[], metavar="AUDIO_FILE",
+                       help="Additional audio files to transcribe together with audio_file in one batch")
+    parser.add_argument("--worker", action="store_true",
+                       help="Keep the model loaded and read JSON requests from stdin, one per line")
     parser.add_argument("--device", default="auto", 
                        help="Device for inference (auto, cuda, cpu)")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch",
+                       help="Inference backend, 'onnx' runs the encoder on ONNX Runtime")
+    parser.add_argument("--compile", action="store_true",
+                       help="Compile the model with torch.compile (CUDA only, slow first run)")
+    parser.add_argument("--no-int8", action="store_true",
+                       help="Disable int8 quantization on CPU")
     parser.add_argument("--temperature", type=float, default=0, 
                        help="Sampling temperature")
     parser.add_argument("--compression_ratio_threshold", type=float, default=2.4,
@@ -133,47 +1062,58 @@ def main():
                        help="Initial prompt to guide the model")
     parser.add_argument("--word-timestamps", action="store_true",
                        help="Extract word-level timestamps")
+    parser.add_argument("--cache-mel", action="store_true",
+                       help="Cache mel spectrograms on disk for faster re-transcription")
     
     args = parser.parse_args()
+
+    if args.worker:
+        import_backends()
+        serve(args.model, args.device, compile=args.compile, int8=not args.no_int8,
+              backend=args.backend)
+        return
+
+    if not args.audio_file:
+        parser.error("audio_file is required unless --worker is given")
     
-    audio_path = Path(args.audio_file)
+    audio_paths = [Path(args.audio_file)] + [Path(p) for p in args.batch]
     
-    if not audio_path.exists():
-        print(f"Error: Audio file not found: {audio_path}", file=sys.stderr)
-        sys.exit(1)
+    for audio_path in audio_paths:
+        if not audio_path.exists():
+            print(f"Error: Audio file not found: {audio_path}", file=sys.stderr)
+            sys.exit(1)
+    
+    options = {
+        "language": args.language if args.language else None,
+        "temperature": args.temperature,
+        "compression_ratio_threshold": args.compression_ratio_threshold,
+        "logprob_threshold": args.logprob_threshold,
+        "no_speech_threshold": args.no_speech_threshold,
+        "fp16": not args.no_fp16,
+        "translate": args.translate,
+        "condition_on_previous_text": not args.no_condition_on_previous_text,
+        "initial_prompt": args.initial_prompt if args.initial_prompt else None,
+        "word_timestamps": args.word_timestamps,
+        "cache_mel": args.cache_mel,
+    }
     
     try:
-        result = transcribe_audio(
-            audio_path,
-            model_name=args.model,
-            language=args.language if args.language else None,
-            device=args.device,
-            temperature=args.temperature,
-            compression_ratio_threshold=args.compression_ratio_threshold,
-            logprob_threshold=args.logprob_threshold,
-            no_speech_threshold=args.no_speech_threshold,
-            fp16=not args.no_fp16,
-            translate=args.translate,
-            condition_on_previous_text=not args.no_condition_on_previous_text,
-            initial_prompt=args.initial_prompt if args.initial_prompt else None,
-            word_timestamps=args.word_timestamps
-        )
+        import_backends()
+        device = resolve_device(args.device)
+        model = load_model(args.model, device, compile=args.compile, int8=not args.no_int8,
+                           backend=args.backend, fp16=not args.no_fp16)
+
+        if args.batch:
+            # One JSON line per file, in the order the files were given
+            results = transcribe_audio_batch(model, audio_paths, device=device, **options)
+            for audio_path, result in zip(audio_paths, results):
+                write_json({"audio_path": str(audio_path), **format_result(result)})
+            return
+
+        result = transcribe_audio(model, audio_paths[0], device=device, **options)
         
         # Output result as JSON to stdout (for Pensieve to parse)
-        output = {
-            "text": result["text"].strip(),
-            "language": result["language"],
-            "segments": [
-                {
-                    "start": seg["start"],
-                    "end": seg["end"],
-                    "text": seg["text"].strip()
-                }
-                for seg in result["segments"]
-            ]
-        }
-        
-        print(json.dumps(output, ensure_ascii=False))
+        write_json(format_result(result))
         
     except Exception as e:
         print(f"Error during transcription: {e}", file=sys.stderr)
@@ -144,6 +144,10 @@ const doSummaryStep = async (job: PostProcessingJob) => {
     return;
   setStep("summary");
 
+  // Local LLMs run on the same GPU as Whisper
+  if (settings.llm.provider === "ollama" || settings.llm.provider === "lmstudio") {
+    await whisper.releaseModels();
+  }
   const summary = await llm.summarize(transcript);
   await history.updateRecording(job.recordingId, { summary });
 };
@@ -1,6 +1,8 @@
 import path from "path";
 import fs from "fs/promises";
+import readline from "readline";
 import log from "electron-log/main";
+import { ExecaChildProcess } from "execa";
 import {
   buildArgs,
   getExtraResourcesFolder,
@@ -23,6 +25,120 @@ const whisperScriptPath = process.env.NODE_ENV === "development"
   ? path.join(__dirname, "../../scripts", "whisper_transcribe.py")
   : path.join(getExtraResourcesFolder(), "whisper_transcribe.py");
 
+type WhisperWorker = {
+  process: ExecaChildProcess;
+  // The worker answers requests in order, oldest first
+  pending: {
+    resolve: (line: string) => void;
+    reject: (error: Error) => void;
+  }[];
+};
+
+let worker: WhisperWorker | null = null;
+
+// Models are unloaded after this long without transcriptions, so they don't
+// hold (GPU) memory for the rest of the session
+const idleTimeout = 5 * 60 * 1000;
+let idleTimer: NodeJS.Timeout | undefined;
+
+// The Python script runs as a long-lived worker so the Whisper model stays
+// loaded between recordings. Requests and responses are exchanged as one
+// JSON object per line over stdin/stdout.
+const getWorker = () => {
+  if (worker) {
+    return worker;
+  }
+
+  const args = [...pythonArgs, whisperScriptPath, "--worker"];
+  log.info("Starting GPU-accelerated Whisper worker", pythonPath, args);
+
+  const current: WhisperWorker = {
+    process: runner.execute(pythonPath, args, {
+      cwd: getExtraResourcesFolder(),
+      env: {
+        ...process.env,
+        PATH: `${getExtraResourcesFolder()};${process.env.PATH}`,
+      },
+      // The worker outlives single transcriptions, don't keep its output
+      buffer: false,
+    }),
+    pending: [],
+  };
+
+  const rejectPending = (error: Error) => {
+    for (const { reject } of current.pending.splice(0)) {
+      reject(error);
+    }
+  };
+
+  readline
+    .createInterface({ input: current.process.stdout! })
+    .on("line", (line) => {
+      // Responses are single JSON objects, anything else is stray output
+      if (!line.startsWith("{")) {
+        log.info("Whisper stdout:", line);
+        return;
+      }
+      current.pending.shift()?.resolve(line);
+    });
+
+  // Log stderr for debugging
+  current.process.stderr?.on("data", (data) => {
+    const line = data.toString();
+    log.info("Whisper:", line.trim());
+
+    // Try to extract progress from stderr
+    // Python script outputs progress info to stderr
+    const progressMatch = line.match(/(\d+)%/);
+    if (progressMatch) {
+      const percent = parseInt(progressMatch[1]) / 100;
+      postprocess.setProgress("whisper", percent);
+    }
+  });
+
+  // Writing to a worker that died or never started fails with EPIPE, which
+  // would otherwise be an unhandled stream error
+  current.process.stdin?.on("error", (error) => {
+    log.error("Failed to write to Whisper worker", error);
+    rejectPending(error);
+  });
+
+  const onExit = () => {
+    log.info("Whisper worker exited");
+    rejectPending(new Error("Whisper worker exited unexpectedly"));
+    if (worker === current) {
+      worker = null;
+    }
+  };
+  current.process.then(onExit, onExit);
+
+  worker = current;
+  return current;
+};
+
+const sendRequest = (request: Record<string, unknown>) => {
+  const current = getWorker();
+  return new Promise<string>((resolve, reject) => {
+    current.pending.push({ resolve, reject });
+    current.process.stdin?.write(`${JSON.stringify(request)}\n`);
+  });
+};
+
+// Unloads the worker's models to free their (GPU) memory, e.g. for a local
+// LLM. The worker itself keeps running and reloads models on demand.
+export const releaseModels = async () => {
+  clearTimeout(idleTimer);
+  if (!worker) {
+    return;
+  }
+
+  try {
+    await sendRequest({ unload: true });
+  } catch (err) {
+    log.error("Failed to unload Whisper models", err);
+  }
+};
+
 export const processWavFile = async (
   input: string,
   output: string,
@@ -41,115 +157,36 @@ export const processWavFile = async (
   // modelId is now the PyTorch model name directly (e.g., "base", "large-v3", "turbo")
   const modelSize = modelId;
   
-  // Build arguments for Python Whisper script with PyTorch parameters
-  const args = [
-    ...pythonArgs,
-    whisperScriptPath,
-    input,
-    modelSize,
-    settings.language === "auto" ? "" : settings.language, // Empty string for auto-detection
-    "--device", settings.device,
-    "--temperature", settings.temperature.toString(),
-    "--compression_ratio_threshold", settings.compressionRatioThreshold.toString(),
-    "--logprob_threshold", settings.logprobThreshold.toString(),
-    "--no_speech_threshold", settings.noSpeechThreshold.toString(),
-  ];
-  
-  // Add optional flags
-  if (!settings.fp16) {
-    args.push("--no-fp16");
-  }
-  if (settings.translate) {
-    args.push("--translate");
-  }
-  if (!settings.conditionOnPreviousText) {
-    args.push("--no-condition-on-previous-text");
-  }
-  if (settings.wordTimestamps) {
-    args.push("--word-timestamps");
-  }
-  if (settings.initialPrompt) {
-    args.push("--initial-prompt", settings.initialPrompt);
-  }
+  // Request for the Python Whisper worker with PyTorch parameters
+  const request = {
+    audio_path: input,
+    model: modelSize,
+    device: settings.device,
+    language: settings.language === "auto" ? null : settings.language, // null for auto-detection
+    temperature: settings.temperature,
+    compression_ratio_threshold: settings.compressionRatioThreshold,
+    logprob_threshold: settings.logprobThreshold,
+    no_speech_threshold: settings.noSpeechThreshold,
+    fp16: settings.fp16,
+    translate: settings.translate,
+    condition_on_previous_text: settings.conditionOnPreviousText,
+    initial_prompt: settings.initialPrompt || null,
+    word_timestamps: settings.wordTimestamps,
+  };
 
-  log.info("Processing wav file with GPU-accelerated Whisper", pythonPath, args);
+  log.info("Processing wav file with GPU-accelerated Whisper", request);
 
-  let transcriptionResult = "";
-  
-  const whisperProcess = runner.execute(pythonPath, args, {
-    cwd: getExtraResourcesFolder(),
-    env: {
-      ...process.env,
-      PATH: `${getExtraResourcesFolder()};${process.env.PATH}`,
-    },
-  });
-  
-  // Capture stdout for JSON result
-  // NOTE: Previously we only appended chunks that started with '{', which
-  // caused large JSON outputs to be truncated at buffer boundaries (e.g. 64KB).
-  // Instead, accumulate all stdout chunks and attempt to parse the full
-  // buffered string after the child process exits.
-  whisperProcess.stdout?.on("data", (data) => {
-    try {
-      transcriptionResult += data.toString();
-    } catch (err) {
-      // Defensive: if toString() fails for some reason, log a readable message
-      log.error("Error decoding whisper stdout chunk:", err);
-    }
+  // A single JSON line per response, so large outputs can't be cut off at
+  // stdout buffer boundaries
+  clearTimeout(idleTimer);
+  const transcriptionResult = await sendRequest(request).finally(() => {
+    idleTimer = setTimeout(releaseModels, idleTimeout);
   });
   
-  // Log stderr for debugging
-  whisperProcess.stderr?.on("data", (data) => {
-    const line = data.toString();
-    log.info("Whisper:", line.trim());
-    
-    // Try to extract progress from stderr
-    // Python script outputs progress info to stderr
-    const progressMatch = line.match(/(\d+)%/);
-    if (progressMatch) {
-      const percent = parseInt(progressMatch[1]) / 100;
-      postprocess.setProgress("whisper", percent);
-    }
-  });
-  
-  await whisperProcess;
-  
-  // Parse JSON result and save to output file
+  // Parse JSON result
+  let result: any;
   try {
-    const result = JSON.parse(transcriptionResult);
-    
-    // Convert to whisper.cpp JSON format for compatibility
-    const whisperFormat = {
-      systeminfo: "GPU-accelerated PyTorch Whisper with ROCm",
-      model: {
-        type: modelSize,
-        multilingual: true,
-        vocab: 51864,
-        audio: {}
-      },
-      params: {
-        model: getModelPath(modelId),
-        language: result.language,
-        translate: settings.translate
-      },
-      result: {
-        language: result.language
-      },
-      transcription: result.segments.map((seg: any) => ({
-        timestamps: {
-          from: formatTimestamp(seg.start),
-          to: formatTimestamp(seg.end)
-        },
-        offsets: {
-          from: Math.round(seg.start * 1000),
-          to: Math.round(seg.end * 1000)
-        },
-        text: seg.text
-      }))
-    };
-    
-    await fs.writeFile(`${out}.json`, JSON.stringify(whisperFormat, null, 2));
-    log.info("Processed Wav File with GPU acceleration");
+    result = JSON.parse(transcriptionResult);
   } catch (error) {
     // Provide better diagnostics to debug truncation / parse issues
   // Safely extract message from unknown error types for TypeScript
@@ -164,7 +201,7 @@ export const processWavFile = async (
     log.error(`First '{' at: ${firstBrace}, last '}' at: ${lastBrace}`);
 
     // Show a small preview around the last brace / tail of the output to help
-    // identify if the JSON was cut off at a buffer boundary.
+    // identify if the JSON was cut off.
     try {
       const previewStart = Math.max(0, lastBrace - 200);
       const previewEnd = Math.min(len, lastBrace + 200);
@@ -186,6 +223,43 @@ export const processWavFile = async (
     // Re-throw the original error so upstream code can handle it as before.
     throw error;
   }
+
+  if (result.error) {
+    throw new Error(`Whisper failed: ${result.error}`);
+  }
+
+  // Convert to whisper.cpp JSON format for compatibility and save to output file
+  const whisperFormat = {
+    systeminfo: "GPU-accelerated PyTorch Whisper with ROCm",
+    model: {
+      type: modelSize,
+      multilingual: true,
+      vocab: 51864,
+      audio: {}
+    },
+    params: {
+      model: getModelPath(modelId),
+      language: result.language,
+      translate: settings.translate
+    },
+    result: {
+      language: result.language
+    },
+    transcription: result.segments.map((seg: any) => ({
+      timestamps: {
+        from: formatTimestamp(seg.start),
+        to: formatTimestamp(seg.end)
+      },
+      offsets: {
+        from: Math.round(seg.start * 1000),
+        to: Math.round(seg.end * 1000)
+      },
+      text: seg.text
+    }))
+  };
+
+  await fs.writeFile(`${out}.json`, JSON.stringify(whisperFormat, null, 2));
+  log.info("Processed Wav File with GPU acceleration");
 };
 
 // Helper function to format timestamp as HH:MM:SS.mmm